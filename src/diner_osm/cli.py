@@ -1,10 +1,16 @@
 import logging
+import os
 from argparse import ArgumentParser
 from pathlib import Path
 
 from bokeh.plotting import show
 
-from diner_osm.config import DinerOsmConfig, get_config
+from diner_osm.config import (
+    DinerOsmConfig,
+    OutputFormats,
+    configure_logging,
+    get_config,
+)
 from diner_osm.prepare import prepare_data, save_data
 from diner_osm.retrieve import ensure_data
 from diner_osm.visualize import plot_data
@@ -44,6 +50,26 @@ def get_arg_parser(config: DinerOsmConfig) -> ArgumentParser:
             "and saved to ./data/populations.json"
         ),
     )
+    parent_parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        required=False,
+        help=(
+            "The number of processes used to prepare versions in parallel "
+            "(default: %(default)s)."
+        ),
+    )
+    parent_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        required=False,
+        help=(
+            "Directory to cache extracted places as GeoParquet, e.g. data/.cache. "
+            "Unchanged files are then not read again for the same config."
+        ),
+    )
     parser = ArgumentParser()
     subparsers = parser.add_subparsers(dest="command", required=True)
     subparsers.add_parser(
@@ -51,7 +77,10 @@ def get_arg_parser(config: DinerOsmConfig) -> ArgumentParser:
     )
     prepare_data_parser = subparsers.add_parser(
         "prepare-data",
-        help="Prepare data and save GeoDataFrames as GeoJSON files.",
+        help=(
+            "Prepare data and save GeoDataFrames as GeoJSON, GeoParquet "
+            "or FlatGeobuf files."
+        ),
         parents=[parent_parser],
     )
     prepare_data_parser.add_argument(
@@ -59,18 +88,21 @@ def get_arg_parser(config: DinerOsmConfig) -> ArgumentParser:
         type=Path,
         required=False,
         default=Path("data"),
-        help="Output directory for GeoJSON files.",
+        help="Output directory for GeoJSON, GeoParquet or FlatGeobuf files.",
+    )
+    prepare_data_parser.add_argument(
+        "--output-format",
+        choices=list(OutputFormats),
+        default=OutputFormats.geojson,
+        required=False,
+        help="The file format to save GeoDataFrames in (default: %(default)s).",
     )
 
     return parser
 
 
 def main():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    configure_logging()
     config = get_config()
     options = get_arg_parser(config).parse_args()
     version_paths = ensure_data(config=config, options=options)
@@ -1,6 +1,6 @@
 import logging
 import tomllib
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import StrEnum
 
 from osmium.osm import AREA, NODE, RELATION, WAY
@@ -34,6 +34,12 @@ class Columns(StrEnum):
     by_population = "by_population"
 
 
+class OutputFormats(StrEnum):
+    geojson = "geojson"
+    parquet = "parquet"
+    fgb = "fgb"
+
+
 class EntityNames(StrEnum):
     area = "area"
     node = "node"
@@ -48,8 +54,11 @@ ENTITY_MAPPING = {
     EntityNames.way: WAY,
 }
 
+# Maps osmium's single-character type strings to entity names
+ENTITY_NAMES = {name[0]: name for name in EntityNames}
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PlacesConfig:
     entity: EntityNames | None = None
     keys: list[str] = field(default_factory=list)
@@ -60,7 +69,7 @@ class PlacesConfig:
             assert self.entity in EntityNames, "invalid entity"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ClipConfig(PlacesConfig):
     bbox: list[float] = field(default_factory=list)
 
@@ -69,7 +78,7 @@ class ClipConfig(PlacesConfig):
             assert len(self.bbox) == 4, "invalid bbox"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RegionConfig:
     areas: PlacesConfig
     clip: ClipConfig
@@ -83,10 +92,10 @@ class RegionConfig:
                 logging.warning(
                     f"Overwriting provided '{config.entity}' to '{EntityNames.area}' for RegionConfig.{attr} EntityFilter"
                 )
-            config.entity = EntityNames.area
+            object.__setattr__(self, attr, replace(config, entity=EntityNames.area))
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DinerOsmConfig:
     url: str
     regions: dict[str, str]
@@ -94,6 +103,14 @@ class DinerOsmConfig:
     region_configs: dict[str, RegionConfig]
 
 
+def configure_logging(level: int = logging.INFO) -> None:
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
 def get_config(file: str = "osm_config.toml") -> DinerOsmConfig:
     with open(file, mode="rb") as fp:
         config = tomllib.load(fp)
@@ -1,70 +1,76 @@
-import json
+import hashlib
 import logging
+import operator
+import os
 from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from functools import lru_cache, reduce
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.context import BaseContext
 from pathlib import Path
 
 import numpy as np
+import orjson
 import osmium
+import pandas as pd
+import pyarrow as pa
 import requests
-from geopandas import GeoDataFrame, GeoSeries
+import shapely
+from geopandas import GeoDataFrame, GeoSeries, read_parquet
 from numpy.typing import NDArray
-from osmium.filter import (
-    EmptyTagFilter,
-    EntityFilter,
-    GeoInterfaceFilter,
-    KeyFilter,
-    TagFilter,
-)
-from osmium.osm import Area, Node, Relation, Way, osm_entity_bits
+from osmium.filter import EmptyTagFilter, EntityFilter, KeyFilter, TagFilter
+from osmium.geom import WKBFactory
+from osmium.osm import OSMObject
+from pyproj import CRS, Transformer
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 from diner_osm.config import (
     ENTITY_MAPPING,
+    ENTITY_NAMES,
+    ClipConfig,
     Columns,
     DefaultTags,
     DinerOsmConfig,
     EnrichProperties,
     EntityNames,
+    OutputFormats,
     PlacesConfig,
     RegionConfig,
+    configure_logging,
 )
 
+# Decoding threads per file processor, 0 leaves the number to osmium
+READER_THREADS = 0
 
-class EnrichAttributes:
-    def add_attributes(self, o: osm_entity_bits, id: str, entity_name: EntityNames):
-        geo_interface = getattr(o, "__geo_interface__", None)
-        # Filter out objects without geo_interface
-        if geo_interface is None:
-            logging.warning(f"Removed {entity_name}: {id}. Missing geo_interface.")
-            return True
-        geo_props: dict = geo_interface["properties"]
-        # Filter out objects if properties would be overwritten (should not happen)
-        if intersect := set(
-            [EnrichProperties.osm_id, EnrichProperties.osm_url]
-        ).intersection(geo_props.keys()):
-            logging.warning(f"Filtered {id=} with {intersect=}")
-            return True
-        geo_props[EnrichProperties.osm_id] = f"{entity_name[0]}{id}"
-        geo_props[EnrichProperties.osm_url] = f"https://www.osm.org/{entity_name}/{id}"
-        geo_props[DefaultTags.wikidata] = geo_props.pop(DefaultTags.wikidata, None)
-        return False
 
-    def area(self, a: Area):
-        if a.from_way():
-            return self.add_attributes(a, a.orig_id(), EntityNames.way)
-        return self.add_attributes(a, a.orig_id(), EntityNames.relation)
+def set_reader_threads(num_threads: int) -> None:
+    global READER_THREADS
+    READER_THREADS = num_threads
 
-    def node(self, n: Node):
-        return self.add_attributes(n, n.id, EntityNames.node)
 
-    def way(self, w: Way):
-        return self.add_attributes(w, w.id, EntityNames.way)
+def init_worker(reader_threads: int, log_level: int) -> None:
+    # Workers start without the logging set up by main
+    configure_logging(level=log_level)
+    set_reader_threads(reader_threads)
 
-    def relation(self, r: Relation):
-        return self.add_attributes(r, r.id, EntityNames.relation)
 
+def get_mp_context() -> BaseContext:
+    # Start workers from a fresh process, the reader threads of this one
+    # would otherwise be forked along. forkserver is not available on Windows.
+    if "forkserver" in get_all_start_methods():
+        return get_context("forkserver")
+    return get_context("spawn")
 
-def extract_places(config: PlacesConfig, path: Path) -> GeoDataFrame:
-    fp = osmium.FileProcessor(path).with_areas().with_filter(EmptyTagFilter())
+
+def get_file_processor(config: PlacesConfig, path: Path) -> osmium.FileProcessor:
+    thread_pool = osmium.io.ThreadPool(num_threads=READER_THREADS)
+    fp = (
+        osmium.FileProcessor(path, thread_pool=thread_pool)
+        .with_areas()
+        .with_filter(EmptyTagFilter())
+    )
     if config.entity:
         fp.with_filter(EntityFilter(ENTITY_MAPPING[config.entity]))
     for key in config.keys:
@@ -75,29 +81,323 @@ def extract_places(config: PlacesConfig, path: Path) -> GeoDataFrame:
         else:
             tags = [(key, value)]
         fp.with_filter(TagFilter(*tags))
-    tags_to_keep = list(DefaultTags) + list(config.tags) + config.keys
-    fp.with_filter(GeoInterfaceFilter(tags=tags_to_keep)).with_filter(
-        EnrichAttributes()
+    return fp
+
+
+def create_wkb(factory: WKBFactory, o: OSMObject) -> str | None:
+    try:
+        if o.is_way():
+            return factory.create_linestring(o)
+        if o.is_area():
+            return factory.create_multipolygon(o)
+    except (osmium.InvalidLocationError, RuntimeError):
+        pass
+    return None
+
+
+def matches(config: PlacesConfig, o: OSMObject) -> bool:
+    # Same conditions as the filters of get_file_processor
+    if config.entity and o.type_str() != config.entity[0]:
+        return False
+    if not all(key in o.tags for key in config.keys):
+        return False
+    return all(
+        o.tags.get(key) in (value if isinstance(value, list) else [value])
+        for key, value in config.tags.items()
     )
-    return GeoDataFrame.from_features(fp, crs=4326).drop_duplicates(
-        EnrichProperties.osm_id
+
+
+class PlacesCollector:
+    # Collects column-wise and builds all geometries in vectorized calls:
+    # node coordinates go into a contiguous array, other geometries into WKB
+    def __init__(self, config: PlacesConfig):
+        self.config = config
+        self.wkbs: list[str | None] = []
+        self.entity_names: list[str] = []
+        self.orig_ids: list[int] = []
+        self.node_rows: list[int] = []
+        self.node_coords: list[tuple[float, float]] = []
+        self.seen: set[tuple[str, int]] = set()
+        tags_to_keep = dict.fromkeys(
+            list(DefaultTags) + list(config.tags) + config.keys
+        )
+        self.tags: dict[str, list[str | None]] = {tag: [] for tag in tags_to_keep}
+
+    def add(
+        self,
+        o: OSMObject,
+        entity_name: str,
+        id: int,
+        wkb: str | None,
+        coords: tuple[float, float] | None,
+    ) -> None:
+        if coords is not None:
+            self.node_rows.append(len(self.wkbs))
+            self.node_coords.append(coords)
+        self.wkbs.append(wkb)
+        self.seen.add((entity_name, id))
+        self.entity_names.append(entity_name)
+        self.orig_ids.append(id)
+        for tag, values in self.tags.items():
+            values.append(o.tags.get(tag))
+
+    def to_gdf(self) -> GeoDataFrame:
+        geometries = shapely.from_wkb(np.asarray(self.wkbs, dtype=object))
+        geometries[self.node_rows] = shapely.points(
+            np.asarray(self.node_coords).reshape(-1, 2)
+        )
+        # Enrich with ids in one vectorized step, urls are derived from them
+        entities = pd.Series(self.entity_names, dtype="str")
+        ids = pd.Series(self.orig_ids, dtype="int64").astype("str")
+        return GeoDataFrame(
+            {
+                EnrichProperties.geometry: geometries,
+                **self.tags,
+                EnrichProperties.osm_id: entities.str[0] + ids,
+            },
+            geometry=EnrichProperties.geometry,
+            crs=4326,
+        )
+
+
+def get_shared_file_processor(
+    configs: list[PlacesConfig], path: Path
+) -> osmium.FileProcessor:
+    thread_pool = osmium.io.ThreadPool(num_threads=READER_THREADS)
+    fp = (
+        osmium.FileProcessor(path, thread_pool=thread_pool)
+        .with_areas()
+        .with_filter(EmptyTagFilter())
     )
+    if all(config.entity for config in configs):
+        entities = {ENTITY_MAPPING[config.entity] for config in configs}
+        fp.with_filter(EntityFilter(reduce(operator.or_, entities)))
+    # Any object matching one of the configs has at least one of their keys
+    required_keys = [config.keys + list(config.tags) for config in configs]
+    if all(required_keys):
+        fp.with_filter(KeyFilter(*{keys[0] for keys in required_keys}))
+    return fp
 
 
-def extract_areas(region_config: RegionConfig, path: Path) -> GeoDataFrame:
-    gdf = extract_places(config=region_config.areas, path=path)
-    clip_config = region_config.clip
+def extract_from_file(configs: list[PlacesConfig], path: Path) -> list[GeoDataFrame]:
+    # Several configs share one pass over the file, objects are matched in Python
+    if len(configs) == 1:
+        fp = get_file_processor(config=configs[0], path=path)
+    else:
+        fp = get_shared_file_processor(configs=configs, path=path)
+    collectors = [PlacesCollector(config) for config in configs]
+    factory = WKBFactory()
+    for o in fp:
+        # Relations have no geometry themselves, multipolygons come as areas
+        if o.is_relation():
+            continue
+        if o.is_area():
+            id = o.orig_id()
+            entity_name = EntityNames.way if o.from_way() else EntityNames.relation
+        else:
+            id = o.id
+            entity_name = ENTITY_NAMES[o.type_str()]
+        # Skip duplicates, e.g. closed ways emitted as way and as area
+        targets = [
+            c
+            for c in collectors
+            if (entity_name, id) not in c.seen
+            and (len(collectors) == 1 or matches(c.config, o))
+        ]
+        if not targets:
+            continue
+        # Filter out objects without a valid geometry
+        wkb, coords = None, None
+        if o.is_node() and o.location.valid():
+            coords = (o.location.lon, o.location.lat)
+        elif (wkb := create_wkb(factory, o)) is None:
+            logging.warning(f"Removed {entity_name}: {id}. Missing geometry.")
+            continue
+        for collector in targets:
+            collector.add(o, entity_name=entity_name, id=id, wkb=wkb, coords=coords)
+    return [collector.to_gdf() for collector in collectors]
+
+
+# Bump when the extracted columns or geometries change, to not read stale caches
+CACHE_VERSION = 1
+
+
+def get_cache_file(cache_dir: Path, config: PlacesConfig, path: Path) -> Path:
+    # Keyed on size and modification time, hashing the file takes as long as reading it
+    stat = os.stat(path)
+    key = orjson.dumps(
+        [
+            CACHE_VERSION,
+            os.path.realpath(path),
+            stat.st_size,
+            stat.st_mtime_ns,
+            asdict(config),
+        ],
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return cache_dir / f"{hashlib.sha256(key).hexdigest()[:16]}.parquet"
+
+
+def extract_many(
+    configs: list[PlacesConfig], path: Path, cache_dir: Path | None = None
+) -> list[GeoDataFrame]:
+    if cache_dir is None:
+        return extract_from_file(configs=configs, path=path)
+    cache_files = [get_cache_file(cache_dir, config, path) for config in configs]
+    gdfs = {
+        i: read_parquet(cache_file)
+        for i, cache_file in enumerate(cache_files)
+        if cache_file.exists()
+    }
+    missing = [i for i in range(len(configs)) if i not in gdfs]
+    if missing:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        extracted = extract_from_file(configs=[configs[i] for i in missing], path=path)
+        for i, gdf in zip(missing, extracted):
+            # Write to a temporary file first, so readers never see a partial file
+            tmp_file = cache_files[i].with_suffix(f".{os.getpid()}.tmp")
+            gdf.to_parquet(tmp_file)
+            os.replace(tmp_file, cache_files[i])
+            gdfs[i] = gdf
+    return [gdfs[i] for i in range(len(configs))]
+
+
+def extract_places(
+    config: PlacesConfig, path: Path, cache_dir: Path | None = None
+) -> GeoDataFrame:
+    return extract_many(configs=[config], path=path, cache_dir=cache_dir)[0]
+
+
+def get_osm_urls(osm_ids: pd.Series) -> pd.Series:
+    entities = osm_ids.str[0].map(ENTITY_NAMES)
+    return "https://www.osm.org/" + entities + "/" + osm_ids.str[1:]
+
+
+def clip_gdf(
+    gdf: GeoDataFrame, mask: GeoDataFrame | list[float], keep_geom_type: bool = False
+) -> GeoDataFrame:
+    # Nothing to clip, or nothing to clip to
+    if gdf.empty or (isinstance(mask, GeoDataFrame) and mask.empty):
+        return gdf.iloc[:0]
+    geoms = gdf.geometry.to_numpy()
+    bounds = shapely.bounds(geoms)
+    if isinstance(mask, GeoDataFrame):
+        mask_geoms = mask.geometry.to_numpy()
+        minx, miny, maxx, maxy = shapely.total_bounds(mask_geoms)
+    else:
+        minx, miny, maxx, maxy = mask
+    # Rows outside the bounds of all masks are dropped with a cheap array test
+    candidates = np.flatnonzero(
+        (bounds[:, 0] <= maxx)
+        & (bounds[:, 1] <= maxy)
+        & (bounds[:, 2] >= minx)
+        & (bounds[:, 3] >= miny)
+    )
+    if isinstance(mask, GeoDataFrame):
+        # The areas' spatial index is built once and reused by get_joined_gdf
+        shapely.prepare(mask_geoms)
+        geom_idx, mask_idx = mask.sindex.query(
+            geoms[candidates], predicate="intersects"
+        )
+        geom_idx = candidates[geom_idx]
+        # Sort hits by row, so the masks of each row are one contiguous slice
+        order = np.argsort(geom_idx, kind="stable")
+        geom_idx, mask_idx = geom_idx[order], mask_idx[order]
+        rows, starts = np.unique(geom_idx, return_index=True)
+        ends = np.append(starts[1:], len(geom_idx))
+        # Geometries inside a single mask are kept as is, the rest is intersected
+        inside = shapely.contains(mask_geoms[mask_idx], geoms[geom_idx])
+        inside_counts = np.bincount(geom_idx[inside], minlength=len(geoms))[rows]
+        clipped = geoms[rows]
+        for k in np.flatnonzero(inside_counts == 0):
+            clip_geom = shapely.union_all(mask_geoms[mask_idx[starts[k] : ends[k]]])
+            clipped[k] = shapely.intersection(clipped[k], clip_geom)
+    else:
+        # Geometries within the bbox are kept as is, the rest is intersected at once
+        rows = candidates
+        clipped = geoms[rows]
+        crossing = ~(
+            (bounds[rows, 0] >= minx)
+            & (bounds[rows, 1] >= miny)
+            & (bounds[rows, 2] <= maxx)
+            & (bounds[rows, 3] <= maxy)
+        )
+        clipped[crossing] = shapely.intersection(clipped[crossing], shapely.box(*mask))
+    if keep_geom_type:
+        # Drop parts of lower dimension, e.g. lines where polygons only touch
+        dims = shapely.get_dimensions(geoms[rows])
+        for i in np.flatnonzero(shapely.get_type_id(clipped) == 7):
+            parts = shapely.get_parts(clipped[i])
+            clipped[i] = shapely.union_all(
+                parts[shapely.get_dimensions(parts) == dims[i]]
+            )
+        keep = ~shapely.is_empty(clipped) & (shapely.get_dimensions(clipped) == dims)
+    else:
+        keep = ~shapely.is_empty(clipped)
+    gdf = gdf.iloc[rows[keep]].copy()
+    gdf[gdf.geometry.name] = GeoSeries(clipped[keep], index=gdf.index, crs=gdf.crs)
+    return gdf
+
+
+def clip_areas(
+    gdf: GeoDataFrame, clip_config: ClipConfig, clip_mask: GeoDataFrame | None
+) -> GeoDataFrame:
     if not gdf.empty and clip_config.bbox:
         logging.info(f"Area is clipped to {clip_config.bbox=}")
-        gdf = gdf.clip(clip_config.bbox, keep_geom_type=True)
-    if not gdf.empty and any(clip_config.tags):
+        gdf = clip_gdf(gdf, clip_config.bbox, keep_geom_type=True)
+    if not gdf.empty and clip_mask is not None:
         logging.info(f"Area is clipped to {clip_config.tags=}")
-        clip_mask = extract_places(config=clip_config, path=path)
-        gdf = gdf.clip(clip_mask, keep_geom_type=True)
+        gdf = clip_gdf(gdf, clip_mask, keep_geom_type=True)
     return gdf
 
 
-def fetch_wikidata_populations(ids: list[str]) -> dict[str, str]:
+def extract_areas(
+    region_config: RegionConfig, path: Path, cache_dir: Path | None = None
+) -> GeoDataFrame:
+    gdf_areas, _ = extract_areas_and_places(
+        region_config=region_config, path=path, with_places=False, cache_dir=cache_dir
+    )
+    return gdf_areas
+
+
+def extract_areas_and_places(
+    region_config: RegionConfig,
+    path: Path,
+    with_places: bool = True,
+    cache_dir: Path | None = None,
+) -> tuple[GeoDataFrame, GeoDataFrame | None]:
+    # Areas, clip mask and places are extracted in a single pass over the file
+    configs = [region_config.areas]
+    if with_places:
+        configs.append(region_config.places)
+    clip_config = region_config.clip
+    if any(clip_config.tags):
+        configs.append(clip_config)
+    gdfs = extract_many(configs=configs, path=path, cache_dir=cache_dir)
+    gdf_areas = gdfs.pop(0)
+    gdf_places = gdfs.pop(0) if with_places else None
+    clip_mask = gdfs.pop(0) if gdfs else None
+    return clip_areas(gdf_areas, clip_config, clip_mask), gdf_places
+
+
+def get_session() -> requests.Session:
+    # Reuse connections and retry transient errors, honoring Retry-After.
+    # Queries are sent as POST, which urllib3 does not retry by default.
+    retries = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"GET", "POST"}),
+    )
+    session = requests.Session()
+    session.headers["User-Agent"] = "diner-osm (https://github.com/KatieBSC/diner-osm)"
+    session.mount("https://", HTTPAdapter(max_retries=retries))
+    return session
+
+
+def fetch_wikidata_populations(
+    session: requests.Session, ids: list[str]
+) -> dict[str, str]:
     logging.info(f"Querying wikidata for {len(ids)} ids.")
     query = """
 SELECT ?place ?population WHERE {{
@@ -107,9 +407,14 @@ SELECT ?place ?population WHERE {{
 }}
 """.format(" ".join([f"wd:{x}" for x in ids]))
     url = "https://query.wikidata.org/sparql"
-    res = requests.get(url, params={"format": "json", "query": query})
+    # POST keeps large chunks clear of URL length limits
+    res = session.post(
+        url,
+        data={"query": query},
+        headers={"Accept": "application/sparql-results+json"},
+    )
     res.raise_for_status()
-    data = res.json()
+    data = orjson.loads(res.content)
     return {
         result["place"]["value"].split("/")[-1]: result["population"]["value"]
         for result in data["results"]["bindings"]
@@ -117,118 +422,274 @@ SELECT ?place ?population WHERE {{
 
 
 def get_populations(
-    ids: NDArray[np.str_], file: str = "data/populations.json"
-) -> dict[str, float]:
+    ids: NDArray[np.str_], file: str = "data/populations.json", chunk_size: int = 250
+) -> pd.Series:
     try:
-        with open(file) as f:
-            populations = json.load(f)
+        with open(file, mode="rb") as f:
+            populations = orjson.loads(f.read())
     except FileNotFoundError:
         populations = {}
     if missing_ids := [x for x in ids if x not in populations]:
-        chunks = [missing_ids[i : i + 20] for i in range(0, len(missing_ids), 20)]
-        for chunk in chunks:
-            retrieved_pops = fetch_wikidata_populations(ids=chunk)
-            populations |= {x: retrieved_pops.get(x, "null") for x in chunk}
-        with open(file, mode="w") as f:
-            json.dump(populations, f)
-    return {
-        x: float(populations[x]) if str(populations[x]).isnumeric() else np.nan
-        for x in ids
-    }
+        chunks = [
+            missing_ids[i : i + chunk_size]
+            for i in range(0, len(missing_ids), chunk_size)
+        ]
+        # Chunks are queried concurrently, below the query service's limit of
+        # 5 parallel queries per client
+        with get_session() as session, ThreadPoolExecutor(max_workers=4) as executor:
+            results = executor.map(
+                lambda chunk: fetch_wikidata_populations(session=session, ids=chunk),
+                chunks,
+            )
+            for chunk, retrieved_pops in zip(chunks, results):
+                populations |= {x: retrieved_pops.get(x, "null") for x in chunk}
+        with open(file, mode="wb") as f:
+            f.write(orjson.dumps(populations))
+    # Populations indexed by wikidata id, missing values ("null") become NaN
+    srs = pd.Series(populations, dtype="str").reindex(ids)
+    return pd.to_numeric(srs, errors="coerce").astype("float64")
+
+
+# Min-max normalization for columns
+def normalize(srs: pd.Series) -> NDArray[np.float64]:
+    # Scale in place on one array instead of allocating intermediate series
+    values = srs.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    if np.isnan(values).all():
+        return values
+    low, high = np.nanmin(values), np.nanmax(values)
+    values -= low
+    # A constant column becomes NaN, like the 0 / 0 of pandas
+    with np.errstate(invalid="ignore"):
+        values /= high - low
+    return values
+
+
+def divide(a: NDArray, b: NDArray) -> NDArray[np.float64]:
+    # Handle the case that the divisor is 0 or missing
+    return np.divide(a, b, out=np.full(len(a), np.nan), where=b > 0)
+
+
+@lru_cache
+def get_transformer(crs: CRS, to_epsg: int) -> Transformer:
+    # Set up once per crs, instead of once per to_crs call
+    return Transformer.from_crs(crs, to_epsg, always_xy=True)
+
+
+def get_sqkms(geoms: NDArray[np.object_], crs: CRS) -> NDArray[np.float64]:
+    # UTM zone 33N for areas in meters
+    transformer = get_transformer(crs, to_epsg=32633)
+    projected = shapely.transform(
+        geoms, lambda xy: np.column_stack(transformer.transform(*xy.T))
+    )
+    return shapely.area(projected) / 1_000_000
 
 
 def get_joined_gdf(
     gdf_areas: GeoDataFrame, gdf_places: GeoDataFrame, with_populations: bool = False
 ) -> GeoDataFrame:
-    # Min-max normalization for columns
-    def normalize(srs: GeoSeries) -> GeoSeries:
-        return (srs - srs.min()) / (srs.max() - srs.min())
-
     # Suffix to use for joining
     area, place = "area", "place"
-    # Suffixed right geometry column
-    gdf_places[EnrichProperties.geometry.suffix(place)] = gdf_places[
-        EnrichProperties.geometry
-    ]
-    gdf = gdf_areas.sjoin(
-        df=gdf_places,
-        how="left",
-        predicate="contains",
-        lsuffix=area,
-        rsuffix=place,
-    )
-    # Suffix left geometry column
-    gdf.rename_geometry(EnrichProperties.geometry.suffix(area), inplace=True)
+    # Positional (area, place) pairs where the area contains the place
+    place_idx, area_idx = gdf_areas.sindex.query(
+        gdf_places.geometry.values, predicate="within"
+    )
+    totals = np.bincount(area_idx, minlength=len(gdf_areas))
+    # Reproject each area once, before it is repeated for each of its places
+    sqkms = get_sqkms(gdf_areas.geometry.to_numpy(), crs=gdf_areas.crs)
+    totals_by_sqkm = divide(totals, sqkms)
+    # Keep areas without places as in a left join
+    empty_idx = np.flatnonzero(totals == 0)
+    area_idx = np.concatenate([area_idx, empty_idx])
+    place_idx = np.concatenate([place_idx, np.full(len(empty_idx), -1)])
+    order = np.lexsort((place_idx, area_idx))
+    area_idx, place_idx = area_idx[order], place_idx[order]
+    # Suffix columns present in both frames, including the geometries
+    shared = gdf_areas.columns.intersection(gdf_places.columns)
+    gdf_left = (
+        pd.DataFrame(gdf_areas)
+        .iloc[area_idx]
+        .rename(columns={col: f"{col}_{area}" for col in shared})
+        .reset_index(drop=True)
+    )
+    gdf_right = (
+        pd.DataFrame(gdf_places)
+        .reset_index(drop=True)
+        .reindex(place_idx)
+        .rename(columns={col: f"{col}_{place}" for col in shared})
+        .reset_index(drop=True)
+    )
+    gdf = GeoDataFrame(
+        pd.concat([gdf_left, gdf_right], axis=1),
+        geometry=EnrichProperties.geometry.suffix(area),
+        crs=gdf_areas.crs,
+    )
     # Enrich columns
-    gdf[Columns.total.value] = gdf.groupby(EnrichProperties.osm_id.suffix(area))[
-        EnrichProperties.osm_id.suffix(place)
-    ].transform("count")
-    gdf[Columns.sqkm.value] = gdf.to_crs(epsg=32633).geometry.area / 1_000_000
-    gdf[Columns.total_by_sqkm.value] = gdf[Columns.total] / gdf[Columns.sqkm]
+    gdf[Columns.total.value] = totals[area_idx]
+    gdf[Columns.sqkm.value] = sqkms[area_idx]
+    gdf[Columns.total_by_sqkm.value] = totals_by_sqkm[area_idx]
     # Normalize columns
     gdf[Columns.by_total.value] = normalize(gdf[Columns.total])
     gdf[Columns.by_area.value] = normalize(gdf[Columns.total_by_sqkm])
     # Optionally enrich with population data
     if with_populations:
-        wiki_col = DefaultTags.wikidata.suffix(area)
-        populations = get_populations(
-            ids=gdf[gdf[wiki_col].notnull()][wiki_col].unique()
+        gdf = add_populations(gdf)
+
+    return gdf
+
+
+def add_populations(
+    gdf: GeoDataFrame, populations: pd.Series | None = None
+) -> GeoDataFrame:
+    wiki_col = DefaultTags.wikidata.suffix("area")
+    if populations is None:
+        populations = get_populations(ids=gdf[wiki_col].dropna().unique())
+    gdf[Columns.population.value] = gdf[wiki_col].map(populations)
+    gdf[Columns.total_by_pop.value] = divide(
+        gdf[Columns.total].to_numpy(dtype=float),
+        gdf[Columns.population].to_numpy(dtype=float),
+    )
+    gdf[Columns.by_population.value] = normalize(gdf[Columns.total_by_pop])
+    return gdf
+
+
+def prepare_version(
+    region_config: RegionConfig,
+    path: Path,
+    gdf_areas: GeoDataFrame | None,
+    cache_dir: Path | None = None,
+) -> GeoDataFrame | None:
+    if gdf_areas is None:
+        gdf_areas, gdf_places = extract_areas_and_places(
+            region_config=region_config, path=path, cache_dir=cache_dir
         )
-        gdf[Columns.population.value] = gdf[wiki_col].map(populations)
-        # Handle the case that population is 0
-        gdf[Columns.total_by_pop.value] = gdf.apply(
-            lambda row: row[Columns.total] / row[Columns.population]
-            if row[Columns.population] > 0
-            else np.nan,
-            axis=1,
+    else:
+        gdf_places = extract_places(
+            config=region_config.places, path=path, cache_dir=cache_dir
         )
-        gdf[Columns.by_population.value] = normalize(gdf[Columns.total_by_pop])
+    if gdf_places.empty:
+        return None
+    gdf_places = clip_gdf(gdf_places, gdf_areas)
+    return get_joined_gdf(gdf_areas=gdf_areas, gdf_places=gdf_places)
 
-    osm_id_cols = [EnrichProperties.osm_id.suffix(s) for s in [area, place]]
-    return gdf.drop_duplicates(osm_id_cols).reset_index(drop=True)
+
+def prepare_version_table(
+    region_config: RegionConfig,
+    path: Path,
+    gdf_areas: GeoDataFrame | None,
+    cache_dir: Path | None = None,
+) -> pa.Table | None:
+    # Arrow tables are sent back much faster than pickled geometries
+    gdf = prepare_version(
+        region_config=region_config,
+        path=path,
+        gdf_areas=gdf_areas,
+        cache_dir=cache_dir,
+    )
+    return None if gdf is None else pa.table(gdf.to_arrow())
 
 
 def prepare_data(
     config: DinerOsmConfig, options: Namespace, version_paths: dict[str, Path]
 ) -> dict[str, GeoDataFrame]:
     region_config = config.region_configs[options.region]
-    gdfs = {}
+    gdf_areas = None
     if options.version_for_areas != "false":
         gdf_areas = extract_areas(
             region_config=region_config,
             path=version_paths[options.version_for_areas],
+            cache_dir=options.cache_dir,
         )
-    for version in options.versions:
-        if options.version_for_areas == "false":
-            gdf_areas = extract_areas(
+    # Versions are independent, so they are prepared in parallel processes
+    max_workers = max(1, min(options.workers, len(options.versions)))
+    if max_workers == 1:
+        results = {
+            version: prepare_version(
                 region_config=region_config,
                 path=version_paths[version],
+                gdf_areas=gdf_areas,
+                cache_dir=options.cache_dir,
             )
-        gdf_places = extract_places(
-            config=region_config.places,
-            path=version_paths[version],
-        )
-        if gdf_places.empty:
-            continue
-        gdf_places = gdf_places.clip(gdf_areas)
-        gdfs[version] = get_joined_gdf(
-            gdf_areas=gdf_areas,
-            gdf_places=gdf_places,
-            with_populations=options.with_populations,
-        )
+            for version in options.versions
+        }
+    else:
+        # Each worker decodes with its share of the cores instead of osmium's
+        # default of one thread per core
+        reader_threads = max(1, (os.cpu_count() or 1) // max_workers)
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=get_mp_context(),
+            initializer=init_worker,
+            initargs=(reader_threads, logging.getLogger().level),
+        ) as executor:
+            futures = {
+                version: executor.submit(
+                    prepare_version_table,
+                    region_config=region_config,
+                    path=version_paths[version],
+                    gdf_areas=gdf_areas,
+                    cache_dir=options.cache_dir,
+                )
+                for version in options.versions
+            }
+        results = {
+            version: None
+            if (table := future.result()) is None
+            else GeoDataFrame.from_arrow(
+                table, geometry=EnrichProperties.geometry.suffix("area")
+            )
+            for version, future in futures.items()
+        }
+    gdfs = {version: gdf for version, gdf in results.items() if gdf is not None}
+    if options.with_populations and gdfs:
+        # Fetch populations once for the areas of all versions, in this process
+        # so only one process writes their cache
+        wiki_col = DefaultTags.wikidata.suffix("area")
+        ids = pd.concat([gdf[wiki_col] for gdf in gdfs.values()]).dropna().unique()
+        populations = get_populations(ids=ids)
+        gdfs = {
+            version: add_populations(gdf, populations=populations)
+            for version, gdf in gdfs.items()
+        }
     return gdfs
 
 
+def save_gdf(gdf: GeoDataFrame, filename: Path, output_format: OutputFormats) -> None:
+    # Only keep the areas geometry when writing to file
+    gdf.drop(
+        columns=(EnrichProperties.geometry.suffix("place")),
+        inplace=True,
+        errors="ignore",
+    )
+    # Add urls next to the ids, they are only needed in the files
+    for suffix in ["area", "place"]:
+        osm_id = EnrichProperties.osm_id.suffix(suffix)
+        if osm_id in gdf.columns:
+            gdf.insert(
+                gdf.columns.get_loc(osm_id) + 1,
+                EnrichProperties.osm_url.suffix(suffix),
+                get_osm_urls(gdf[osm_id]),
+            )
+    match output_format:
+        case OutputFormats.parquet:
+            gdf.to_parquet(filename, compression="zstd")
+        case OutputFormats.fgb:
+            gdf.to_file(filename, driver="FlatGeobuf")
+        case _:
+            gdf.to_file(filename, driver="GeoJSON")
+    logging.info(f"Saved gdf to {filename}")
+
+
 def save_data(options: Namespace, gdfs: dict[str, GeoDataFrame]) -> None:
     path: Path = options.output_dir
     path.mkdir(parents=True, exist_ok=True)
-    for version, gdf in gdfs.items():
-        filename = Path(path, f"{version}.geojson")
-        # Only keep the areas geometry when writing to file
-        gdf.drop(
-            columns=(EnrichProperties.geometry.suffix("place")),
-            inplace=True,
-            errors="ignore",
+    # Versions are written in parallel, encoding runs in GDAL and Arrow without the GIL
+    filenames = [Path(path, f"{version}.{options.output_format}") for version in gdfs]
+    with ThreadPoolExecutor(max_workers=max(1, len(gdfs))) as executor:
+        list(
+            executor.map(
+                save_gdf,
+                gdfs.values(),
+                filenames,
+                [options.output_format] * len(gdfs),
+            )
         )
-        gdf.to_file(filename, driver="GeoJSON")
-        logging.info(f"Saved gdf to {filename}")
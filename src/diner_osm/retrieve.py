@@ -1,5 +1,7 @@
 import logging
+import shutil
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin
 
@@ -12,13 +14,51 @@ def get_download_url(config: DinerOsmConfig, region: str, version: str) -> str:
     return urljoin(config.url, f"{config.regions[region]}-{config.versions[version]}")
 
 
-def download_file(url: str, path: Path, chunk_size=10 * 1024) -> None:
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, mode="wb") as file:
-        for chunk in response.iter_content(chunk_size=chunk_size):
-            file.write(chunk)
+def get_validator(response: requests.Response) -> str | None:
+    # Strong ETags identify the exact file, Last-Modified its version
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def download_file(url: str, path: Path, chunk_size=1024 * 1024) -> None:
+    # Download to a partial file first, so an interrupted download is resumed
+    part_path = path.with_name(f"{path.name}.part")
+    validator_path = path.with_name(f"{path.name}.part.validator")
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    headers = {}
+    # Only resume the same remote file, a changed file is sent whole instead
+    if offset and validator_path.exists():
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator_path.read_text()}
+    with requests.get(url, headers=headers, stream=True) as response:
+        content_range = response.headers.get("Content-Range", "")
+        # 416 means there is nothing left, if the partial file has the full size
+        complete = response.status_code == 416 and content_range == f"bytes */{offset}"
+        resumed = response.status_code == 206 and content_range.startswith(
+            f"bytes {offset}-"
+        )
+        restart = response.status_code in (206, 416) and not (complete or resumed)
+        if not (complete or restart):
+            response.raise_for_status()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not resumed:
+                # Servers without range support send the whole file again
+                if validator := get_validator(response):
+                    validator_path.write_text(validator)
+                else:
+                    validator_path.unlink(missing_ok=True)
+            response.raw.decode_content = True
+            with open(part_path, mode="ab" if resumed else "wb") as file:
+                shutil.copyfileobj(response.raw, file, length=chunk_size)
+    if restart:
+        # The partial file does not fit the remote file, start over
+        logging.warning(f"Restarting download for {path}")
+        part_path.unlink()
+        validator_path.unlink(missing_ok=True)
+        return download_file(url=url, path=path, chunk_size=chunk_size)
+    part_path.replace(path)
+    validator_path.unlink(missing_ok=True)
     logging.info(f"Downloaded file to {path}")
 
 
@@ -28,6 +68,7 @@ def ensure_data(
     region = options.region
     versions = set(options.versions) | {options.version_for_areas}
     version_paths = {}
+    downloads = {}
     for version in versions:
         if suffix := config.versions.get(version):
             filename = f"{config.regions[region].split('/')[-1]}-{suffix}"
@@ -42,9 +83,11 @@ def ensure_data(
             logging.info(f"{filename} already exists. Skipping download.")
         else:
             logging.info(f"Starting download for {filename}")
-            download_file(
-                url=get_download_url(config=config, region=region, version=version),
-                path=version_path,
+            downloads[version_path] = get_download_url(
+                config=config, region=region, version=version
             )
         version_paths[version] = version_path
+    # Versions are downloaded concurrently, each transfer waits on the network
+    with ThreadPoolExecutor(max_workers=max(1, len(downloads))) as executor:
+        list(executor.map(download_file, downloads.values(), downloads))
     return version_paths
@@ -1,6 +1,12 @@
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 
+import numpy as np
+import orjson
+import pandas as pd
+import shapely
 import xyzservices.providers as xyz
 from bokeh.layouts import Row, column, row
 from bokeh.models import (
@@ -15,9 +21,85 @@ from bokeh.models import (
 )
 from bokeh.plotting import figure
 from bokeh.transform import linear_cmap
-from geopandas import GeoDataFrame
+from geopandas import GeoDataFrame, GeoSeries
 
 from diner_osm.config import Columns, DefaultTags, DinerOsmConfig, EnrichProperties
+from diner_osm.prepare import get_osm_urls, get_transformer
+
+# Renames the suffixed area/place columns of a joined gdf back to plot columns
+PLOT_COLUMNS = list(EnrichProperties) + [DefaultTags.name_]
+AREA_COLUMNS = {col.suffix("area"): col for col in PLOT_COLUMNS}
+PLACE_COLUMNS = {col.suffix("place"): col for col in PLOT_COLUMNS}
+TOOLTIPS = [(DefaultTags.name_, f"@{DefaultTags.name_}")]
+# Columns to color the areas by, by_population is added with populations
+CMAP_COLUMNS = (Columns.by_total, Columns.by_area)
+
+
+def add_osm_urls(gdf: GeoDataFrame) -> GeoDataFrame:
+    # Only the plotted rows need urls for the tap tool
+    gdf[EnrichProperties.osm_url.value] = get_osm_urls(gdf[EnrichProperties.osm_id])
+    return gdf
+
+
+def to_mercator(gdf: GeoDataFrame) -> GeoDataFrame:
+    # Whole meters are finer than the plot shows and shorten the GeoJSON
+    transformer = get_transformer(gdf.crs, to_epsg=3857)
+    geoms = shapely.transform(
+        gdf.geometry.to_numpy(),
+        lambda xy: np.column_stack(transformer.transform(*xy.T)).round(),
+    )
+    gdf[gdf.geometry.name] = GeoSeries(geoms, index=gdf.index, crs=3857)
+    return gdf
+
+
+def to_geojson(gdf: GeoDataFrame) -> str:
+    # Geometries are written by GEOS and embedded as is, instead of being
+    # mapped to nested python lists first. Missing tags are left out of the
+    # properties, the computed columns are kept as null so bokeh always has
+    # a column to color by, even if it is missing in every row.
+    geometries = shapely.to_geojson(gdf.geometry.to_numpy())
+    records = gdf.drop(columns=gdf.geometry.name).to_dict(orient="records")
+    features = [
+        {
+            "type": "Feature",
+            "properties": {
+                k: v for k, v in record.items() if k in Columns or pd.notna(v)
+            },
+            "geometry": None if geometry is None else orjson.Fragment(geometry),
+        }
+        for geometry, record in zip(geometries, records)
+    ]
+    feature_collection = {"type": "FeatureCollection", "features": features}
+    return orjson.dumps(feature_collection, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def get_plot_sources(gdf: GeoDataFrame) -> tuple[str, str]:
+    # Select the plotted rows and columns at once, the tags are not plotted
+    area_columns = gdf.columns.intersection([*AREA_COLUMNS, *Columns])
+    is_area = ~gdf[EnrichProperties.osm_id.suffix("area")].duplicated()
+    area_source = (
+        gdf.loc[is_area, area_columns]
+        .rename(columns=AREA_COLUMNS)
+        .pipe(add_osm_urls)
+        .set_geometry(EnrichProperties.geometry)
+        .pipe(to_mercator)
+        .pipe(to_geojson)
+    )
+    # Drop rows without place geometry (areas without places)
+    place_columns = gdf.columns.intersection(list(PLACE_COLUMNS))
+    is_place = (
+        gdf[EnrichProperties.geometry.suffix("place")].notnull()
+        & ~gdf[EnrichProperties.osm_id.suffix("place")].duplicated()
+    )
+    place_source = (
+        gdf.loc[is_place, place_columns]
+        .rename(columns=PLACE_COLUMNS)
+        .pipe(add_osm_urls)
+        .set_geometry(EnrichProperties.geometry)
+        .pipe(to_mercator)
+        .pipe(to_geojson)
+    )
+    return area_source, place_source
 
 
 def plot_data(
@@ -25,47 +107,32 @@ def plot_data(
     options: Namespace,
     gdfs: dict[str, GeoDataFrame],
 ) -> Row | None:
-    area_sources, place_sources = {}, {}
-    plot_columns = list(EnrichProperties) + [DefaultTags.name_]
-    for version, gdf in gdfs.items():
-        key = (
-            datetime.today().strftime("%Y.%m")
-            if version == "latest"
-            else f"{version}.01"
-        )
-        area_sources[key] = (
-            gdf.rename(columns={col.suffix("area"): col for col in plot_columns})
-            .drop(columns=(EnrichProperties.geometry.suffix("place")))
-            .drop_duplicates(EnrichProperties.osm_id)
-            .set_geometry(EnrichProperties.geometry)
-            .to_crs(epsg=3857)
-            .to_json()
-        )
-        # Drop rows without place geometry (areas without places)
-        gdf = gdf[gdf[EnrichProperties.geometry.suffix("place")].notnull()]
-        place_sources[key] = (
-            gdf.rename(columns={col.suffix("place"): col for col in plot_columns})
-            .drop(columns=(EnrichProperties.geometry.suffix("area")))
-            .drop_duplicates(EnrichProperties.osm_id)
-            .set_geometry(EnrichProperties.geometry)
-            .to_crs(epsg=3857)
-            .to_json()
-        )
-    if not place_sources or not area_sources:
+    if not gdfs:
         return None
+    # Versions are independent and projecting them releases the GIL
+    with ThreadPoolExecutor(max_workers=len(gdfs)) as executor:
+        sources = executor.map(get_plot_sources, gdfs.values())
+    today = datetime.today().strftime("%Y.%m")
+    area_sources, place_sources = {}, {}
+    for version, (area_source, place_source) in zip(gdfs, sources):
+        key = today if version == "latest" else f"{version}.01"
+        area_sources[key] = area_source
+        place_sources[key] = place_source
 
-    TOOLTIPS = [(DefaultTags.name_, f"@{DefaultTags.name_}")]
-    CMAP_COLUMNS = [Columns.by_total, Columns.by_area]
+    cmap_columns = list(CMAP_COLUMNS)
     if options.with_populations:
-        CMAP_COLUMNS.append(Columns.by_population)
+        cmap_columns.append(Columns.by_population)
 
     # Initial elements
     tags = config.region_configs[options.region].places.tags
     keys = config.region_configs[options.region].places.keys
-    tags_str = " ".join([f"{k}={v}" for k, v in tags.items()])
-    tags_str += " " + " ".join([f"{k}=*" for k in keys])
-    # Assume bounds do not change much between latest and other versions
-    bounds = gdfs[max(gdfs)].to_crs(epsg=3857).total_bounds
+    tags_str = " ".join(
+        chain((f"{k}={v}" for k, v in tags.items()), (f"{k}=*" for k in keys))
+    )
+    # Assume bounds do not change much between latest and other versions.
+    # Only the corners are projected, not every geometry.
+    gdf = gdfs[max(gdfs)]
+    bounds = get_transformer(gdf.crs, to_epsg=3857).transform_bounds(*gdf.total_bounds)
     plot = figure(
         title=f"[{options.region.title()}] {tags_str}",
         tooltips=TOOLTIPS,
@@ -77,12 +144,12 @@ def plot_data(
     )
     plot.add_tile(xyz.OpenStreetMap.Mapnik)
     plot.axis.visible = False
-    cmap = linear_cmap(CMAP_COLUMNS[0], "Cividis256", 0, 1)
+    cmap = linear_cmap(cmap_columns[0], "Cividis256", 0, 1)
     color_bar = ColorBar(color_mapper=cmap["transform"])
     plot.add_layout(color_bar, "right")
 
     toggle = Toggle(label="show places", button_type="default", active=False)
-    radio_button_group = RadioButtonGroup(labels=CMAP_COLUMNS, active=0)
+    radio_button_group = RadioButtonGroup(labels=cmap_columns, active=0)
     slider = Slider(
         start=float(min(area_sources)),
         end=float(max(area_sources)),
@@ -125,7 +192,6 @@ def plot_data(
             area_sources=area_sources,
             sources=place_sources,
             scatter=scatter,
-            places=places,
         ),
         code="""
         const year = cb_obj.value;
@@ -133,10 +199,9 @@ def plot_data(
         areas.data_source.geojson = area_sources[year];
         areas.data_source.change.emit();
 
+        // Places and their scatter share one data source
         scatter.data_source.geojson = sources[year];
         scatter.data_source.change.emit();
-        places.data_source.geojson = sources[year];
-        places.data_source.change.emit();
         """,
     )
     toggle_callback = CustomJS(
@@ -1,14 +1,21 @@
+import os
+
 import osmium
 
 TEST_PATH = "tests/fixtures/testing_data.opl"
 
 
 def generate_test_data() -> None:
+    # Only write the data again when this helper changed since the last write
+    modified = os.path.getmtime(__file__)
+    if os.path.exists(TEST_PATH) and os.path.getmtime(TEST_PATH) >= modified:
+        return
     closed_way_1 = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
     closed_way_2 = [(1, 0), (2, 0), (2, 1), (1, 1), (1, 0)]
     outer_closed_way_1 = [(0, 0), (1, 0), (1, 3), (0, 3), (0, 0)]
     # All the unique nodes required to build the ways
     base_node_coords = sorted(set(closed_way_1 + closed_way_2 + outer_closed_way_1))
+    node_ids = {coord: i for i, coord in enumerate(base_node_coords)}
     # Nodes and tags which are not required to build ways
     node_places = [
         ((0.5, 0.5), {"amenity": "cafe", "cuisine": "ice_cream"}),
@@ -18,15 +25,15 @@ def generate_test_data() -> None:
     # Ways and tags
     way_places = [
         (
-            [base_node_coords.index(coord) for coord in closed_way_1],
+            [node_ids[coord] for coord in closed_way_1],
             {"admin_level": "10", "wikidata": "Q100"},
         ),
         (
-            [base_node_coords.index(coord) for coord in closed_way_2],
+            [node_ids[coord] for coord in closed_way_2],
             {"admin_level": "10"},
         ),
         (
-            [base_node_coords.index(coord) for coord in outer_closed_way_1],
+            [node_ids[coord] for coord in outer_closed_way_1],
             {"admin_level": "9", "wikidata": "Q99"},
         ),
     ]
@@ -1,4 +1,5 @@
 import logging
+from dataclasses import FrozenInstanceError
 
 import pytest
 
@@ -44,3 +45,9 @@ def test_overwriting_entity(caplog) -> None:
     assert config.areas.entity == EntityNames.area
     assert config.clip.entity == EntityNames.area
     assert config.places.entity is None
+
+
+def test_frozen_config() -> None:
+    config = PlacesConfig(entity="node")
+    with pytest.raises(FrozenInstanceError):
+        config.entity = EntityNames.way
@@ -1,16 +1,23 @@
+import logging
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from unittest.mock import MagicMock, call, patch
+from unittest.mock import ANY, MagicMock, call, patch
 
 import numpy as np
+import orjson
 import osmium
 import osmium.filter
 import pandas as pd
 import pytest
-from geopandas import GeoDataFrame
+import shapely
+from geopandas import GeoDataFrame, GeoSeries
+from geopandas.testing import assert_geodataframe_equal
 from pandas.testing import assert_series_equal
 from pytest_mock import MockerFixture
+from shapely import Polygon, box
 
+from diner_osm import prepare
 from diner_osm.config import (
     ClipConfig,
     Columns,
@@ -21,12 +28,22 @@ from diner_osm.config import (
     RegionConfig,
 )
 from diner_osm.prepare import (
-    EnrichAttributes,
+    clip_gdf,
+    divide,
     extract_areas,
+    extract_many,
     extract_places,
+    fetch_wikidata_populations,
+    get_file_processor,
     get_joined_gdf,
+    get_mp_context,
+    get_osm_urls,
     get_populations,
+    get_session,
+    get_sqkms,
+    normalize,
     prepare_data,
+    prepare_version,
     save_data,
 )
 
@@ -40,6 +57,8 @@ def cli_options() -> Namespace:
         version_for_areas="latest",
         versions=["2021", "latest"],
         with_populations=False,
+        workers=2,
+        cache_dir=None,
     )
 
 
@@ -75,17 +94,20 @@ def cli_options() -> Namespace:
 def test_extract_places(
     mocker: MockerFixture, config: PlacesConfig, expected_ids: list[str]
 ) -> None:
-    from_features_spy = mocker.spy(GeoDataFrame, "from_features")
+    get_file_processor_spy = mocker.spy(prepare, "get_file_processor")
     gdf = extract_places(config=config, path=Path(TEST_PATH))
 
     # Contains default + config columns
     expected_columns = set(
-        [DefaultTags.name_] + list(EnrichProperties) + list(config.tags) + config.keys
+        [DefaultTags.name_, EnrichProperties.geometry, EnrichProperties.osm_id]
+        + list(config.tags)
+        + config.keys
     )
     missing = expected_columns - set(gdf.columns)
     assert not missing, missing
-    # Should have expected ids
+    # Should have expected ids without duplicates
     assert set(gdf[EnrichProperties.osm_id]) == set(expected_ids)
+    assert gdf[EnrichProperties.osm_id].is_unique
     # Should filter out objects with no tags
     expected_filter_types = [osmium.filter.EmptyTagFilter]
     # Should filter for entity
@@ -104,10 +126,112 @@ def test_extract_places(
         elif isinstance(value, list):
             assert (gdf[key].isin(value)).all()
     # Should be called with correct filters
-    expected_filter_types += [osmium.filter.GeoInterfaceFilter, EnrichAttributes]
-    called_with_filters = from_features_spy.call_args[0][0]._filters
+    called_with_filters = get_file_processor_spy.spy_return._filters
+    assert len(called_with_filters) == len(expected_filter_types)
     for i, filter_type in enumerate(expected_filter_types):
         assert isinstance(called_with_filters[i], filter_type)
+    # Should build geometries with a crs
+    assert gdf.crs == 4326
+
+
+def test_set_reader_threads(
+    mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(prepare, "READER_THREADS", prepare.READER_THREADS)
+    thread_pool_spy = mocker.spy(osmium.io, "ThreadPool")
+    prepare.set_reader_threads(2)
+    get_file_processor(config=PlacesConfig(), path=Path(TEST_PATH))
+    # Should decode with the configured number of threads
+    thread_pool_spy.assert_called_once_with(num_threads=2)
+
+
+@pytest.mark.parametrize(
+    "start_methods,expected",
+    [(["fork", "spawn", "forkserver"], "forkserver"), (["spawn"], "spawn")],
+    ids=["posix", "windows"],
+)
+def test_get_mp_context(
+    start_methods: list[str], expected: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(prepare, "get_all_start_methods", lambda: start_methods)
+    # Should fall back to spawn where forkserver is not available
+    assert get_mp_context().get_start_method() == expected
+
+
+def test_extract_places_skips_relations(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    path = tmp_path / "relations.opl"
+    coords = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    with osmium.SimpleWriter(str(path)) as writer:
+        for i, location in enumerate(coords, start=1):
+            node = osmium.osm.mutable.Node(id=i, location=location, tags={})
+            writer.add_node(node)
+        writer.add_way(osmium.osm.mutable.Way(id=1, nodes=[1, 2, 3, 4, 1], tags={}))
+        for i, type_ in enumerate(["multipolygon", "route"], start=1):
+            writer.add_relation(
+                osmium.osm.mutable.Relation(
+                    id=i,
+                    members=[("w", 1, "outer")],
+                    tags={"name": f"relation_{i}", "type": type_},
+                )
+            )
+    with caplog.at_level(logging.WARNING):
+        gdf = extract_places(config=PlacesConfig(keys=["name"]), path=path)
+    # Should keep the multipolygon as area and drop raw relations silently
+    assert gdf[EnrichProperties.osm_id].tolist() == ["r1"]
+    assert "Removed relation" not in caplog.text
+
+
+@pytest.mark.parametrize(
+    "configs",
+    [
+        [
+            PlacesConfig(entity="area", tags={"admin_level": "10"}),
+            PlacesConfig(entity="node", keys=["name"], tags={"amenity": "cafe"}),
+        ],
+        [
+            PlacesConfig(tags={"admin_level": ["9", "10"]}),
+            PlacesConfig(entity="way", keys=["wikidata"]),
+            PlacesConfig(),
+        ],
+    ],
+    ids=["entities-keys", "no-keys"],
+)
+def test_extract_many(configs: list[PlacesConfig]) -> None:
+    gdfs = extract_many(configs=configs, path=TEST_PATH)
+    # Should match extracting each config on its own
+    assert len(gdfs) == len(configs)
+    for gdf, config in zip(gdfs, configs):
+        assert_geodataframe_equal(gdf, extract_places(config=config, path=TEST_PATH))
+
+
+def test_extract_many_cached(tmp_path: Path, mocker: MockerFixture) -> None:
+    configs = [
+        PlacesConfig(entity="area", tags={"admin_level": "10"}),
+        PlacesConfig(entity="node", keys=["name"], tags={"amenity": "cafe"}),
+    ]
+    extract_from_file = mocker.spy(prepare, "extract_from_file")
+    extract_many(configs=configs[:1], path=TEST_PATH, cache_dir=tmp_path)
+    gdfs = extract_many(configs=configs, path=TEST_PATH, cache_dir=tmp_path)
+    # Should only extract the configs which are not cached yet
+    assert extract_from_file.call_args_list == [
+        call(configs=configs[:1], path=TEST_PATH),
+        call(configs=configs[1:], path=TEST_PATH),
+    ]
+    assert len(list(tmp_path.glob("*.parquet"))) == len(configs)
+    # Should read the same data back from the cache
+    cached_gdfs = extract_many(configs=configs, path=TEST_PATH, cache_dir=tmp_path)
+    assert extract_from_file.call_count == 2
+    for gdf, cached_gdf, config in zip(gdfs, cached_gdfs, configs):
+        expected = extract_places(config=config, path=TEST_PATH)
+        assert_geodataframe_equal(gdf, expected)
+        assert_geodataframe_equal(cached_gdf, expected)
+    # Should not read caches of another cache version
+    extract_from_file.reset_mock()
+    mocker.patch.object(prepare, "CACHE_VERSION", prepare.CACHE_VERSION + 1)
+    extract_many(configs=configs, path=TEST_PATH, cache_dir=tmp_path)
+    extract_from_file.assert_called_once_with(configs=configs, path=TEST_PATH)
 
 
 @pytest.mark.parametrize(
@@ -157,7 +281,7 @@ def test_extract_areas(
     expected_ids: list[str],
     mocker: MockerFixture,
 ) -> None:
-    clip_spy = mocker.spy(GeoDataFrame, "clip")
+    clip_spy = mocker.spy(prepare, "clip_gdf")
     gdf = extract_areas(config, TEST_PATH)
     # Should have expected ids
     assert set(gdf[EnrichProperties.osm_id]) == set(expected_ids)
@@ -173,24 +297,159 @@ def test_extract_areas(
 def test_get_populations() -> None:
     ids = ["1", "2", "3"]
     with (
-        patch("json.dump"),
         patch("builtins.open") as mock_file,
         patch("diner_osm.prepare.fetch_wikidata_populations") as fetch_populations,
     ):
         mock_file.side_effect = [FileNotFoundError, MagicMock()]
         fetch_populations.return_value = {"1": "100", "2": "0", "3": "null"}
-        assert get_populations(ids, "my/fake-file.json") == {
-            "1": 100,
-            "2": 0,
-            "3": np.nan,
+        assert_series_equal(
+            get_populations(ids, "my/fake-file.json"),
+            pd.Series([100, 0, np.nan], index=ids),
+        )
+        fetch_populations.assert_called_once_with(session=ANY, ids=ids)
+
+
+def test_fetch_wikidata_populations() -> None:
+    session = MagicMock()
+    session.post.return_value.content = orjson.dumps(
+        {
+            "results": {
+                "bindings": [
+                    {
+                        "place": {"value": "http://www.wikidata.org/entity/Q1"},
+                        "population": {"value": "100"},
+                    }
+                ]
+            }
         }
-        fetch_populations.assert_called_once_with(ids=ids)
+    )
+    populations = fetch_wikidata_populations(session=session, ids=["Q1", "Q2"])
+    # Should post the query for all ids and map ids to populations
+    assert populations == {"Q1": "100"}
+    session.post.assert_called_once()
+    assert "wd:Q1 wd:Q2" in session.post.call_args.kwargs["data"]["query"]
+
+
+def test_get_session() -> None:
+    with get_session() as session:
+        retries = session.get_adapter("https://query.wikidata.org").max_retries
+    # Should retry the posted queries on transient errors
+    assert retries.is_retry("POST", 503)
+    assert retries.is_retry("GET", 429)
+
+
+def test_get_populations_cached(tmp_path: Path) -> None:
+    file = tmp_path / "populations.json"
+    file.write_bytes(orjson.dumps({"1": "100", "2": "null"}))
+    with patch("diner_osm.prepare.fetch_wikidata_populations") as fetch_populations:
+        assert_series_equal(
+            get_populations(["1", "2"], str(file)),
+            pd.Series([100, np.nan], index=["1", "2"]),
+        )
+        fetch_populations.assert_not_called()
+    with patch("diner_osm.prepare.fetch_wikidata_populations") as fetch_populations:
+        fetch_populations.return_value = {"3": "5"}
+        assert_series_equal(
+            get_populations(["3"], str(file)), pd.Series([5.0], index=["3"])
+        )
+    assert orjson.loads(file.read_bytes()) == {"1": "100", "2": "null", "3": "5"}
+
+
+def test_get_populations_chunks() -> None:
+    ids = ["1", "2", "3"]
+    with (
+        patch("builtins.open") as mock_file,
+        patch("diner_osm.prepare.fetch_wikidata_populations") as fetch_populations,
+    ):
+        mock_file.side_effect = [FileNotFoundError, MagicMock()]
+        fetch_populations.return_value = {}
+        get_populations(ids, "my/fake-file.json", chunk_size=2)
+    # Should query in concurrent chunks sharing one session
+    assert fetch_populations.call_count == 2
+    fetch_populations.assert_has_calls(
+        [call(session=ANY, ids=["1", "2"]), call(session=ANY, ids=["3"])],
+        any_order=True,
+    )
+    sessions = {c.kwargs["session"] for c in fetch_populations.call_args_list}
+    assert len(sessions) == 1
+
+
+def test_get_osm_urls() -> None:
+    osm_ids = pd.Series(["n8", "w0", "r12", None])
+    assert_series_equal(
+        get_osm_urls(osm_ids),
+        pd.Series(
+            [
+                "https://www.osm.org/node/8",
+                "https://www.osm.org/way/0",
+                "https://www.osm.org/relation/12",
+                None,
+            ]
+        ),
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize(
+    "mask",
+    [
+        [0.25, 0, 2.5, 3],
+        GeoDataFrame(geometry=[box(0, 0, 1, 1), box(0.5, 0.5, 2, 2)], crs=4326),
+    ],
+    ids=["bbox", "gdf"],
+)
+def test_clip_gdf(mask: list[float] | GeoDataFrame) -> None:
+    gdf = GeoDataFrame(
+        {"name": ["inside", "crossing", "outside", "touching", "overlapping-bounds"]},
+        geometry=[
+            box(0.5, 0.5, 0.75, 0.75),
+            box(-1, -1, 0.75, 0.75),
+            box(3, 3, 4, 4),
+            box(-1, 0, 0.25, 1),
+            Polygon([(-1, -1), (3, -1), (3, -0.5), (-0.5, -0.5), (-0.5, 4), (-1, 4)]),
+        ],
+        crs=4326,
+    )
+    clipped = clip_gdf(gdf, mask, keep_geom_type=True)
+    expected = gdf.clip(mask, keep_geom_type=True).sort_index()
+    # Should match geopandas clip
+    assert clipped.index.tolist() == expected.index.tolist()
+    assert clipped.geom_equals(expected).all()
+    assert clipped.crs == gdf.crs
+    # Should be empty for an empty mask
+    empty_mask = GeoDataFrame(geometry=[], crs=4326)
+    assert clip_gdf(gdf, empty_mask, keep_geom_type=True).empty
+    assert clip_gdf(gdf.iloc[:0], mask).empty
+
+
+def test_divide() -> None:
+    result = divide(np.array([2, 2, 2]), np.array([4.0, 0.0, np.nan]))
+    # Should be NaN where the divisor is 0 or missing
+    np.testing.assert_array_equal(result, [0.5, np.nan, np.nan])
+
+
+@pytest.mark.parametrize(
+    ("values", "expected"),
+    [
+        ([1, 3, 2], [0.0, 1.0, 0.5]),
+        ([1.0, np.nan, 5.0], [0.0, np.nan, 1.0]),
+        ([2, 2], [np.nan, np.nan]),
+        ([np.nan], [np.nan]),
+        ([], []),
+    ],
+)
+def test_normalize(values: list[float], expected: list[float]) -> None:
+    srs = pd.Series(values, dtype="float64")
+    result = normalize(srs)
+    # Should scale like min-max normalization with pandas
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(result, (srs - srs.min()) / (srs.max() - srs.min()))
 
 
 @pytest.mark.parametrize("with_populations", [True, False])
 @patch("diner_osm.prepare.get_populations")
 def test_get_joined_gdf(get_populations: MagicMock, with_populations: bool) -> None:
-    get_populations.return_value = {"Q100": 100, "Q99": np.nan}
+    get_populations.return_value = pd.Series([100, np.nan], index=["Q100", "Q99"])
     region_config = RegionConfig(
         areas=PlacesConfig(entity="area", tags={"admin_level": "10"}),
         clip=ClipConfig(bbox=[0.25, 0, 2.5, 3]),
@@ -198,7 +457,7 @@ def test_get_joined_gdf(get_populations: MagicMock, with_populations: bool) -> N
     )
     gdf_areas = extract_areas(region_config, TEST_PATH)
     gdf_places = extract_places(region_config.places, TEST_PATH)
-    gdf_places = gdf_places.clip(gdf_areas)
+    gdf_places = clip_gdf(gdf_places, gdf_areas)
     joined_gdf = get_joined_gdf(gdf_areas, gdf_places, with_populations)
 
     # Should have expected ids
@@ -239,55 +498,175 @@ def test_get_joined_gdf(get_populations: MagicMock, with_populations: bool) -> N
         assert Columns.total_by_pop not in joined_gdf.columns
 
 
+def test_get_sqkms() -> None:
+    gdf = GeoDataFrame(geometry=[box(13, 52, 13.1, 52.1)], crs=4326)
+    expected = gdf.to_crs(epsg=32633).area.to_numpy() / 1_000_000
+    # Should use the crs of the geometries
+    for crs in [4326, 3857]:
+        gdf_crs = gdf.to_crs(epsg=crs)
+        sqkms = get_sqkms(gdf_crs.geometry.to_numpy(), crs=gdf_crs.crs)
+        np.testing.assert_allclose(sqkms, expected)
+
+
+def test_get_joined_gdf_keeps_areas_without_places() -> None:
+    gdf_areas = extract_places(
+        PlacesConfig(entity="area", tags={"admin_level": "10"}), TEST_PATH
+    )
+    gdf_places = extract_places(
+        PlacesConfig(entity="node", tags={"cuisine": "german"}), TEST_PATH
+    )
+    joined_gdf = get_joined_gdf(gdf_areas, gdf_places)
+
+    # Should keep one row per area, like a left join
+    assert joined_gdf[EnrichProperties.osm_id.suffix("area")].tolist() == ["w0", "w1"]
+    assert joined_gdf[EnrichProperties.osm_id.suffix("place")].isna().tolist() == [
+        False,
+        True,
+    ]
+    assert joined_gdf[Columns.total].tolist() == [1, 0]
+
+
+def test_prepare_version_reuses_sindex(mocker: MockerFixture) -> None:
+    region_config = RegionConfig(
+        areas=PlacesConfig(entity="area", tags={"admin_level": "10"}),
+        clip=ClipConfig(),
+        places=PlacesConfig(entity="node", keys=["name"], tags={"amenity": "cafe"}),
+    )
+    gdf_areas = extract_areas(region_config, TEST_PATH)
+    strtree = mocker.spy(shapely, "STRtree")
+    for _ in range(2):
+        prepare_version(region_config, TEST_PATH, gdf_areas=gdf_areas)
+    # Should build the spatial index of the areas once for clipping and joining
+    assert strtree.call_count == 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("with_populations", [True, False])
 @pytest.mark.parametrize("version_for_areas", ["latest", "false"])
 def test_prepare_data(
-    version_for_areas: str, cli_options: Namespace, diner_osm_config: DinerOsmConfig
+    version_for_areas: str,
+    with_populations: bool,
+    workers: int,
+    cli_options: Namespace,
+    diner_osm_config: DinerOsmConfig,
 ) -> None:
     region = cli_options.region
     versions = cli_options.versions
+    cli_options.with_populations = with_populations
+    cli_options.workers = workers
     if version_for_areas == "false":
         cli_options.version_for_areas = "false"
     version_paths = {"latest": Path("path/to/latest"), "2021": Path("path/to/2021")}
     with (
+        # Threads instead of processes, so the mocks record the calls
+        patch(
+            "diner_osm.prepare.ProcessPoolExecutor",
+            lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers),
+        ),
         patch("diner_osm.prepare.extract_areas") as extract_areas,
         patch("diner_osm.prepare.extract_places") as extract_places,
+        patch("diner_osm.prepare.extract_areas_and_places") as extract_areas_and_places,
+        patch("diner_osm.prepare.clip_gdf") as clip_gdf,
         patch("diner_osm.prepare.get_joined_gdf") as get_joined_gdf,
+        patch("diner_osm.prepare.get_populations") as get_populations,
+        patch("diner_osm.prepare.add_populations") as add_populations,
     ):
         extract_places.return_value.empty = False
-        prepare_data(diner_osm_config, cli_options, version_paths)
+        extract_areas_and_places.return_value = (MagicMock(), MagicMock(empty=False))
+        get_joined_gdf.return_value = GeoDataFrame(
+            {Columns.total: [1], DefaultTags.wikidata.suffix("area"): ["Q100"]},
+            geometry=GeoSeries([box(0, 0, 1, 1)], crs=4326),
+        ).rename_geometry(EnrichProperties.geometry.suffix("area"))
+        gdfs = prepare_data(diner_osm_config, cli_options, version_paths)
 
     if version_for_areas == "false":
-        # Should call extract_areas for each version
-        extract_areas.assert_has_calls(
+        # Should extract areas and places together for each version
+        extract_areas.assert_not_called()
+        extract_places.assert_not_called()
+        extract_areas_and_places.assert_has_calls(
             [
                 call(
                     region_config=diner_osm_config.region_configs[region],
                     path=version_paths[version],
+                    cache_dir=None,
                 )
                 for version in versions
-            ]
+            ],
+            any_order=True,
         )
+        gdf_areas = extract_areas_and_places.return_value[0]
     else:
         # Should call extract_areas once
         extract_areas.assert_called_once_with(
             region_config=diner_osm_config.region_configs[region],
             path=version_paths["latest"],
+            cache_dir=None,
         )
-    # Should call extract_places for each version
-    assert extract_places.call_count == len(versions)
+        # Should call extract_places for each version
+        assert extract_places.call_count == len(versions)
+        extract_areas_and_places.assert_not_called()
+        gdf_areas = extract_areas()
     # Should call get_joined_gdf for each version
     assert get_joined_gdf.call_count == len(versions)
-    # Should call with extract_areas, clipped extract_places, with_populations
+    # Should call with the areas and the clipped places
     get_joined_gdf.assert_called_with(
-        gdf_areas=extract_areas(),
-        gdf_places=extract_places().clip(),
-        with_populations=cli_options.with_populations,
+        gdf_areas=gdf_areas,
+        gdf_places=clip_gdf(),
     )
+    # Should add populations for each version in the main process
+    if with_populations:
+        # Should fetch populations once for all versions
+        get_populations.assert_called_once()
+        assert get_populations.call_args.kwargs["ids"].tolist() == ["Q100"]
+        assert add_populations.call_count == len(versions)
+        for c in add_populations.call_args_list:
+            assert c.kwargs == {"populations": get_populations.return_value}
+        joined_gdfs = [c.args[0] for c in add_populations.call_args_list]
+        assert gdfs == {version: add_populations() for version in versions}
+    else:
+        get_populations.assert_not_called()
+        add_populations.assert_not_called()
+        assert list(gdfs) == versions
+        joined_gdfs = list(gdfs.values())
+    # Should restore the joined gdfs from the workers' arrow tables
+    for gdf in joined_gdfs:
+        assert_geodataframe_equal(gdf, get_joined_gdf.return_value)
+
+
+def test_prepare_data_processes(cli_options: Namespace) -> None:
+    region_config = RegionConfig(
+        areas=PlacesConfig(entity="area", tags={"admin_level": "10"}),
+        clip=ClipConfig(bbox=[0.25, 0, 2.5, 3]),
+        places=PlacesConfig(entity="node", keys=["name"], tags={"amenity": "cafe"}),
+    )
+    config = DinerOsmConfig(
+        url="", regions={}, versions={}, region_configs={"test": region_config}
+    )
+    cli_options.region = "test"
+    version_paths = {"2021": TEST_PATH, "latest": TEST_PATH}
+    gdfs = prepare_data(config, cli_options, version_paths)
 
+    # Should prepare each version in a worker process like in this one
+    expected = prepare_version(region_config, TEST_PATH, gdf_areas=None)
+    assert list(gdfs) == cli_options.versions
+    for gdf in gdfs.values():
+        assert_geodataframe_equal(gdf, expected)
 
+
+@pytest.mark.parametrize(
+    ("output_format", "driver"), [("geojson", "GeoJSON"), ("fgb", "FlatGeobuf")]
+)
+@patch("diner_osm.prepare.GeoDataFrame.to_parquet")
 @patch("diner_osm.prepare.GeoDataFrame.to_file")
-def test_save_data(to_file_patch: MagicMock, cli_options: Namespace) -> None:
+def test_save_data(
+    to_file_patch: MagicMock,
+    to_parquet_patch: MagicMock,
+    output_format: str,
+    driver: str,
+    cli_options: Namespace,
+) -> None:
     cli_options.output_dir = Path("data/bad-doberan")
+    cli_options.output_format = output_format
     gdfs = {}
     for version in cli_options.versions:
         gdfs[version] = GeoDataFrame()
@@ -297,7 +676,33 @@ def test_save_data(to_file_patch: MagicMock, cli_options: Namespace) -> None:
     assert to_file_patch.call_count == len(cli_options.versions)
     to_file_patch.assert_has_calls(
         [
-            call(Path(f"data/bad-doberan/{version}.geojson"), driver="GeoJSON")
+            call(Path(f"data/bad-doberan/{version}.{output_format}"), driver=driver)
+            for version in cli_options.versions
+        ],
+        any_order=True,
+    )
+    to_parquet_patch.assert_not_called()
+
+
+@patch("diner_osm.prepare.GeoDataFrame.to_parquet")
+@patch("diner_osm.prepare.GeoDataFrame.to_file")
+def test_save_data_parquet(
+    to_file_patch: MagicMock, to_parquet_patch: MagicMock, cli_options: Namespace
+) -> None:
+    cli_options.output_dir = Path("data/bad-doberan")
+    cli_options.output_format = "parquet"
+    gdfs = {}
+    for version in cli_options.versions:
+        gdfs[version] = GeoDataFrame()
+    with patch("diner_osm.prepare.Path.mkdir"):
+        save_data(cli_options, gdfs)
+    # Should have 1 parquet file call per version
+    assert to_parquet_patch.call_count == len(cli_options.versions)
+    to_parquet_patch.assert_has_calls(
+        [
+            call(Path(f"data/bad-doberan/{version}.parquet"), compression="zstd")
             for version in cli_options.versions
-        ]
+        ],
+        any_order=True,
     )
+    to_file_patch.assert_not_called()
@@ -1,11 +1,12 @@
+import io
 from argparse import Namespace
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
 from diner_osm.config import DinerOsmConfig
-from diner_osm.retrieve import ensure_data, get_download_url
+from diner_osm.retrieve import download_file, ensure_data, get_download_url
 
 
 def test_get_download_url(diner_osm_config: DinerOsmConfig) -> None:
@@ -48,3 +49,102 @@ def test_ensure_data(
     else:
         with pytest.raises(KeyError):
             ensure_data(config=diner_osm_config, options=test_options)
+
+
+def mock_response(
+    status_code: int, headers: dict[str, str], content: bytes
+) -> MagicMock:
+    response = MagicMock(status_code=status_code, headers=headers)
+    response.raw = io.BytesIO(content)
+    context = MagicMock()
+    context.__enter__.return_value = response
+    return context
+
+
+@pytest.mark.parametrize(
+    "part,validator,status_code,response_headers,content,expected_headers",
+    [
+        (None, None, 200, {"ETag": '"v1"'}, b"osm-data", {}),
+        (
+            b"osm-",
+            '"v1"',
+            206,
+            {"Content-Range": "bytes 4-7/8"},
+            b"data",
+            {"Range": "bytes=4-", "If-Range": '"v1"'},
+        ),
+        (
+            b"old-",
+            '"v0"',
+            200,
+            {"ETag": '"v1"'},
+            b"osm-data",
+            {"Range": "bytes=4-", "If-Range": '"v0"'},
+        ),
+        (b"old-", None, 200, {}, b"osm-data", {}),
+        (
+            b"osm-data",
+            '"v1"',
+            416,
+            {"Content-Range": "bytes */8"},
+            b"",
+            {"Range": "bytes=8-", "If-Range": '"v1"'},
+        ),
+    ],
+    ids=["new", "resume", "changed", "no-validator", "complete"],
+)
+@patch("diner_osm.retrieve.requests.get")
+def test_download_file(
+    get: MagicMock,
+    part: bytes | None,
+    validator: str | None,
+    status_code: int,
+    response_headers: dict[str, str],
+    content: bytes,
+    expected_headers: dict[str, str],
+    tmp_path: Path,
+) -> None:
+    path = tmp_path / "region.osm.pbf"
+    if part is not None:
+        path.with_name(f"{path.name}.part").write_bytes(part)
+    if validator is not None:
+        path.with_name(f"{path.name}.part.validator").write_text(validator)
+    get.return_value = mock_response(status_code, response_headers, content)
+    download_file(url="https://example.com/region.osm.pbf", path=path)
+    # Should request the remaining bytes of the same file and complete the file
+    get.assert_called_once_with(
+        "https://example.com/region.osm.pbf", headers=expected_headers, stream=True
+    )
+    assert path.read_bytes() == b"osm-data"
+    assert not path.with_name(f"{path.name}.part").exists()
+    assert not path.with_name(f"{path.name}.part.validator").exists()
+
+
+@pytest.mark.parametrize(
+    "part,status_code,response_headers",
+    [
+        (b"osm-data-old", 416, {"Content-Range": "bytes */8"}),
+        (b"osm-", 206, {"Content-Range": "bytes 0-7/8"}),
+    ],
+    ids=["size-mismatch", "offset-mismatch"],
+)
+@patch("diner_osm.retrieve.requests.get")
+def test_download_file_restarts(
+    get: MagicMock,
+    part: bytes,
+    status_code: int,
+    response_headers: dict[str, str],
+    tmp_path: Path,
+) -> None:
+    path = tmp_path / "region.osm.pbf"
+    path.with_name(f"{path.name}.part").write_bytes(part)
+    path.with_name(f"{path.name}.part.validator").write_text('"v1"')
+    get.side_effect = [
+        mock_response(status_code, response_headers, b"osm-data"),
+        mock_response(200, {"ETag": '"v1"'}, b"osm-data"),
+    ]
+    download_file(url="https://example.com/region.osm.pbf", path=path)
+    # Should discard a partial file that does not fit and download it again
+    assert get.call_args_list[1].kwargs["headers"] == {}
+    assert path.read_bytes() == b"osm-data"
+    assert not path.with_name(f"{path.name}.part").exists()
@@ -0,0 +1,46 @@
+import numpy as np
+import orjson
+import shapely
+from geopandas import GeoDataFrame
+from shapely import Point, box
+
+from diner_osm.visualize import to_geojson, to_mercator
+
+
+def test_to_geojson() -> None:
+    gdf = GeoDataFrame(
+        {
+            "name": ["area", None, "none"],
+            "total": [1, 0, 2],
+            "by_area": [0.5, float("nan"), 1 / 3],
+            "by_total": [float("nan")] * 3,
+        },
+        geometry=[box(0, 0, 1, 1), Point(0.5, 0.5), None],
+        crs=3857,
+    )
+    expected = orjson.loads(gdf.to_json(na="drop", drop_id=True))
+    # Should serialize the features like geopandas, without the crs member
+    expected.pop("crs")
+    result = orjson.loads(to_geojson(gdf))
+    properties = [feature.pop("properties") for feature in result["features"]]
+    for feature in expected["features"]:
+        feature.pop("properties")
+    assert result == expected
+    # Should leave out missing tags, but keep missing values of computed columns
+    assert properties == [
+        {"name": "area", "total": 1, "by_area": 0.5, "by_total": None},
+        {"total": 0, "by_area": None, "by_total": None},
+        {"name": "none", "total": 2, "by_area": 1 / 3, "by_total": None},
+    ]
+
+
+def test_to_mercator() -> None:
+    gdf = GeoDataFrame(geometry=[Point(1, 2), box(0.2, 0.2, 3.7, 4.1)], crs=4326)
+    projected = to_mercator(gdf.copy())
+    expected = gdf.to_crs(3857)
+    # Should project like to_crs, rounded to whole meters
+    assert projected.crs == expected.crs
+    np.testing.assert_array_equal(
+        shapely.get_coordinates(projected.geometry),
+        shapely.get_coordinates(expected.geometry).round(),
+    )